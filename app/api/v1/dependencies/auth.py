@@ -1,4 +1,5 @@
-from fastapi import Header, HTTPException
+from fastapi import Depends, Header, HTTPException
+from app.core.config import ADMIN_USERS
 from app.core.security import verify_token
 
 def get_current_user(authorization: str = Header(...)):
@@ -6,4 +7,9 @@ def get_current_user(authorization: str = Header(...)):
     payload = verify_token(token)
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
-    return payload
\ No newline at end of file
+    return payload
+
+def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if current_user.get("sub") not in ADMIN_USERS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
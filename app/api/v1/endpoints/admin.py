@@ -0,0 +1,23 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.api.v1.dependencies.auth import get_admin_user
+from app.core.profiler import list_profiles, load_profile, to_speedscope
+
+router = APIRouter()
+
+
+@router.get("/profiles")
+async def get_profiles(current_user: dict = Depends(get_admin_user)):
+    return {"profiles": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: Literal["collapsed", "speedscope"] = "collapsed", current_user: dict = Depends(get_admin_user)):
+    profile = load_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    metadata, collapsed = profile
+    if format == "speedscope":
+        return to_speedscope(metadata, collapsed)
+    return PlainTextResponse(collapsed)
@@ -1,22 +1,74 @@
-from fastapi import APIRouter, Depends
+import json
+import asyncio
+import hashlib
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
 import app.api.v1.dependencies.auth
 from app.api.v1.dependencies.auth import get_current_user
-from app.core.mainScript import startDownload
+from app.core.config import DISCONNECT_POLL_SECONDS, SEARCH_TIMEOUT_SECONDS
+from app.core.jobs import create_job, get_job, remove_job
+from app.core.mainScript import (
+    DOWNLOADED_IDS_PATH,
+    JobCancelledError,
+    NoVideosFoundError,
+    SearchError,
+    extract_channel_identifier,
+    find_unique_entries,
+    load_downloaded_ids,
+    startDownload,
+)
+from app.core.profiler import new_profile_id, run_profiled, should_profile
+from app.core.scheduler import download_scheduler
+from app.core.search_cache import search_cache
 from app.schemas.downloadParams import KeywordSearchRequest, ChannelSearchRequest
-from typing import Union
+from typing import Literal, Optional, Union
 
 
 router = APIRouter()
 
+# Scheduler cost of a search miss: a few metadata pages, so it always goes in the small-job lane
+SEARCH_SLOT_COST = 1
+
+
+async def run_until_done_or_disconnected(http_request: Request, job, coro):
+    """Await a job coroutine, cancelling the job if the client goes away."""
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if not job.cancelled and await http_request.is_disconnected():
+            print(f"Client disconnected, cancelling job {job.job_id}")
+            job.cancel("client disconnected")
+
+
+async def run_scheduled(job, cost, profile_metadata, func, *args):
+    """
+    Wait for a scheduler slot for the job's owner, then run the blocking function in the threadpool,
+    under the sampling profiler if `profile_metadata` is given.
+    """
+    async with download_scheduler.slot(job.owner, cost, job) as ticket:
+        print(f"Job {job.job_id} started after waiting {ticket.wait_seconds:.2f}s in the {ticket.lane} lane")
+        if profile_metadata:
+            profile_metadata["queue_wait_seconds"] = round(ticket.wait_seconds, 3)
+            return await run_in_threadpool(run_profiled, profile_metadata, func, *args), ticket
+        return await run_in_threadpool(func, *args), ticket
+
 #Download video (protcted)
 
 @router.post("/download")
-async def download_video(request: Union[KeywordSearchRequest, ChannelSearchRequest], current_user: dict = Depends(get_current_user)):
+async def download_video(request: Union[KeywordSearchRequest, ChannelSearchRequest], http_request: Request, current_user: dict = Depends(get_current_user), x_profile: Optional[str] = Header(None)):
 
     # return {"success": True, "message": "Video downloaded successfully", "video_urls": [
     #     "/videosList/Ben_Lionel_Scott/1_ENvgK0mPpqg_combined.mp4"
     # ]}
 
+    try:
+        job = create_job(current_user.get("sub"), request.timeout_seconds, request.job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
     try:
         search_type = ""
         params = {}
@@ -31,13 +83,127 @@ async def download_video(request: Union[KeywordSearchRequest, ChannelSearchReque
             search_type = "channel"
             params.update({"channel_url": request.channel_url, "max_results": request.max_results})
             # return {"message": "channel search"}
-        
+
             # return {"status": "processing", "request": request.dict()}
         print(f"here is the search type and params from video.py: {search_type}, {params}")
 
-        video_urls = startDownload(search_type, params)
-        return {"success": True, "message": "Video downloaded successfully", "video_urls": video_urls}
+        profile_metadata = None
+        if should_profile(x_profile, current_user):
+            profile_metadata = {
+                "profile_id": new_profile_id(),
+                "path": http_request.url.path,
+                "user": current_user.get("sub"),
+                "job_id": job.job_id,
+                "search_type": search_type,
+                "params": params,
+            }
+
+        video_urls, ticket = await run_until_done_or_disconnected(
+            http_request, job, run_scheduled(job, request.max_results, profile_metadata, startDownload, search_type, params, job)
+        )
+        response = {
+            "success": True,
+            "message": "Video downloaded successfully",
+            "video_urls": video_urls,
+            "job_id": job.job_id,
+            "queue_wait_seconds": round(ticket.wait_seconds, 3),
+        }
+        if profile_metadata:
+            response["profile_id"] = profile_metadata["profile_id"]
+        return response
+    except JobCancelledError as e:
+        print(f"Job {job.job_id} cancelled: {job.cancel_reason}")
+        return {"success": False, "message": str(e), "job_id": job.job_id, "cancelled": True, "video_urls": list(e.video_urls)}
     except Exception as e:
         print(f"Error parsing request: {str(e)} in the api video.py")
-        return {"success": False, "message": f"Error parsing request: {str(e)}"}
+        return {"success": False, "message": f"Error parsing request: {str(e)}", "job_id": job.job_id}
+    finally:
+        remove_job(job)
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = get_job(current_user.get("sub"), job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.cancel("cancelled by user")
+    return {"success": True, "message": "Job cancellation requested", "job_id": job_id}
+
+
+@router.get("/queue")
+async def queue_status(current_user: dict = Depends(get_current_user)):
+    return download_scheduler.stats(current_user.get("sub"))
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+#Search shorts without downloading (protected)
+
+@router.get("/search")
+async def search_videos(
+    http_request: Request,
+    search_type: Literal["keyword", "channel"] = Query(description="'keyword' or 'channel'"),
+    max_results: int = Query(gt=0, le=100, description="Number of shorts to return (1-100)"),
+    query: Optional[str] = Query(None, min_length=1, description="Search query, for keyword search"),
+    channel_url: Optional[str] = Query(None, min_length=1, description="Channel URL, @handle or ID, for channel search"),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user),
+):
+    channel_info = None
+    search_query = ""
+    if search_type == "keyword":
+        if not query:
+            raise HTTPException(status_code=422, detail="query is required for keyword search")
+        # YouTube search ignores case and extra spaces, so normalize before using it as a cache key
+        search_query = " ".join(query.split()).lower()
+        cache_key = ("keyword", search_query, max_results)
+    else:
+        if not channel_url:
+            raise HTTPException(status_code=422, detail="channel_url is required for channel search")
+        channel_info = extract_channel_identifier(channel_url.strip())
+        cache_key = ("channel", *channel_info, max_results)
+
+    async def search(job):
+        # Misses run real yt-dlp searches, so they share the download scheduler's fairness and per-user caps,
+        # at a fixed small cost so a preview never waits behind bulk downloads.
+        # Previews ignore the download ledger so the same query always gives the same results.
+        async with download_scheduler.slot(job.owner, SEARCH_SLOT_COST, job):
+            return await run_in_threadpool(
+                find_unique_entries, search_query, max_results, set(), channel_info, job=job, raise_errors=True
+            )
+
+    async def compute():
+        job = create_job(current_user.get("sub"), SEARCH_TIMEOUT_SECONDS)
+        try:
+            return await run_until_done_or_disconnected(http_request, job, search(job))
+        finally:
+            remove_job(job)
+
+    try:
+        entries, age, hit = await search_cache.get_or_compute(cache_key, compute)
+        cache_control = f"private, max-age={max(0, int(search_cache.ttl_seconds - age))}"
+    except NoVideosFoundError:
+        # Not cached: an empty page may just be a transient yt-dlp failure
+        entries, hit = [], False
+        cache_control = "no-cache"
+    except SearchError as e:
+        # Not cached either, so a partial result never gets served for the whole TTL
+        raise HTTPException(status_code=502, detail=str(e))
+    except JobCancelledError as e:
+        # Deadline passed or the client went away; coalesced waiters retry the search themselves
+        raise HTTPException(status_code=504, detail=str(e))
+
+    downloaded_ids = await run_in_threadpool(load_downloaded_ids, DOWNLOADED_IDS_PATH)
+    videos = [{**entry, "downloaded": entry["id"] in downloaded_ids} for entry in entries]
+    body = {"success": True, "search_type": search_type, "count": len(videos), "videos": videos}
 
+    etag = '"' + hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "X-Cache": "HIT" if hit else "MISS"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
@@ -0,0 +1,202 @@
+import os
+import re
+import asyncio
+import threading
+from typing import Optional
+
+import aiohttp
+
+from app.core.config import (
+    ASYNC_DOWNLOAD_CHUNK_SIZE,
+    ASYNC_DOWNLOAD_MAX_CONNECTIONS,
+    ASYNC_DOWNLOAD_RANGE_MIN_SIZE,
+    ASYNC_DOWNLOAD_RANGE_PARTS,
+)
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class StreamingDownloadError(Exception):
+    """Raised when a direct media URL can't be fetched completely"""
+    pass
+
+
+def preallocate(path, size):
+    """Create `path` with `size` bytes reserved so range parts can be written in place."""
+    with open(path, "wb") as f:
+        if size:
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+
+
+class AsyncMediaDownloader:
+    """
+    Fetches direct media URLs on one background event loop shared by all callers.
+
+    A single pooled aiohttp session is reused across videos. Files whose size
+    is known and whose server honours Range requests are split into
+    `range_parts` ranges fetched in parallel into a pre-allocated file; other
+    responses are streamed in order. Reads go through `chunk_size` buffers, so
+    memory per transfer stays bounded, and disk writes run in the loop's
+    executor. `download()` is blocking and safe to call from worker threads;
+    `fetch()` is the coroutine it runs.
+    """
+
+    def __init__(self, max_connections=ASYNC_DOWNLOAD_MAX_CONNECTIONS, chunk_size=ASYNC_DOWNLOAD_CHUNK_SIZE,
+                 range_parts=ASYNC_DOWNLOAD_RANGE_PARTS, range_min_size=ASYNC_DOWNLOAD_RANGE_MIN_SIZE):
+        self.max_connections = max_connections
+        self.chunk_size = chunk_size
+        self.range_parts = range_parts
+        self.range_min_size = range_min_size
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="async-downloader", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Only called on the downloader loop, so no locking is needed
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(sock_connect=15, sock_read=30),
+                read_bufsize=self.chunk_size,
+            )
+        return self._session
+
+    def download(self, url, dest_path, headers=None, job=None) -> int:
+        """Blocking wrapper around fetch() for use from worker threads. Returns the bytes written."""
+        future = asyncio.run_coroutine_threadsafe(self.fetch(url, dest_path, headers, job), self._get_loop())
+        return future.result()
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            self._session = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+    async def fetch(self, url, dest_path, headers=None, job=None) -> int:
+        """Download `url` to `dest_path` via a `.part` file that is removed if the transfer fails."""
+        session = self._get_session()
+        headers = dict(headers or {})
+        part_path = dest_path + ".part"
+        try:
+            # Probe with a one-byte range: a 206 tells us the size and that ranges work,
+            # a 200 means the server ignored the range and we stream that response instead.
+            async with session.get(url, headers={**headers, "Range": "bytes=0-0"}) as response:
+                response.raise_for_status()
+                size = None
+                if response.status == 206:
+                    await response.read()  # drain the probe byte so the connection goes back to the pool
+                    size = self._range_total(response)
+                else:
+                    written = await self._stream(response, part_path, job)
+            if response.status == 206 and size is None:
+                # Ranges work but the total is unknown (e.g. "bytes 0-0/*"): fetch the whole body instead
+                async with session.get(url, headers=headers) as response:
+                    response.raise_for_status()
+                    written = await self._stream(response, part_path, job)
+            elif size is not None:
+                if self.range_parts > 1 and size >= self.range_min_size:
+                    written = await self._fetch_ranges(session, url, headers, part_path, size, job)
+                else:
+                    written = await self._fetch_range(session, url, headers, part_path, 0, size - 1, job, preallocate_size=size)
+            os.replace(part_path, dest_path)
+            return written
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+    @staticmethod
+    def _range_total(response) -> Optional[int]:
+        match = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        return int(match.group(3)) if match else None
+
+    async def _stream(self, response, path, job) -> int:
+        """Write a whole (possibly chunked) 200 response body to `path` in order."""
+        if response.status != 200:
+            raise StreamingDownloadError(f"Expected a full 200 response, got {response.status}")
+        expected = response.content_length
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, preallocate, path, expected)
+        written = 0
+        with open(path, "r+b") as f:
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                if job:
+                    job.check()
+                # Disk writes go to the executor so a slow disk doesn't stall every transfer on the loop
+                await loop.run_in_executor(None, f.write, chunk)
+                written += len(chunk)
+        if expected is not None and written != expected:
+            raise StreamingDownloadError(f"Expected {expected} bytes, got {written}")
+        return written
+
+    async def _fetch_ranges(self, session, url, headers, path, size, job) -> int:
+        await asyncio.get_running_loop().run_in_executor(None, preallocate, path, size)
+        part_size = -(-size // self.range_parts)
+        tasks = [
+            asyncio.ensure_future(self._fetch_range(session, url, headers, path, start, min(start + part_size, size) - 1, job))
+            for start in range(0, size, part_size)
+        ]
+        try:
+            return sum(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _fetch_range(self, session, url, headers, path, start, end, job, preallocate_size=None) -> int:
+        """Fetch bytes start..end (inclusive) and write them at the same offset in `path`."""
+        loop = asyncio.get_running_loop()
+        if preallocate_size is not None:
+            await loop.run_in_executor(None, preallocate, path, preallocate_size)
+        async with session.get(url, headers={**headers, "Range": f"bytes={start}-{end}"}) as response:
+            response.raise_for_status()
+            if response.status != 206:
+                raise StreamingDownloadError(f"Server ignored range {start}-{end}")
+            written = 0
+            with open(path, "r+b") as f:
+                f.seek(start)
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    if job:
+                        job.check()
+                    await loop.run_in_executor(None, f.write, chunk)
+                    written += len(chunk)
+        if written != end - start + 1:
+            raise StreamingDownloadError(f"Range {start}-{end} ended after {written} bytes")
+        return written
+
+
+_downloader = None
+_downloader_lock = threading.Lock()
+
+
+def get_downloader() -> AsyncMediaDownloader:
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            _downloader = AsyncMediaDownloader()
+        return _downloader
+
+
+def close_downloader():
+    with _downloader_lock:
+        if _downloader is not None:
+            _downloader.close()
@@ -7,4 +7,38 @@ SECRET_KEY = os.getenv("SECRET_KEY", "default_secret_key")  # Fallback to a defa
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 720))
 USERNAME = os.getenv("USERNAME", "default_username")
-PASSWORD = os.getenv("PASSWORD", "default_password")
\ No newline at end of file
+PASSWORD = os.getenv("PASSWORD", "default_password")
+
+# How often a running download checks whether its HTTP client has gone away
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 1.0))
+
+# Download scheduler: total concurrent jobs, per-user cap, and the small-job priority lane
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", 4))
+MAX_IN_FLIGHT_PER_USER = int(os.getenv("MAX_IN_FLIGHT_PER_USER", 2))
+SMALL_JOB_MAX_RESULTS = int(os.getenv("SMALL_JOB_MAX_RESULTS", 5))
+SMALL_JOB_RESERVED_SLOTS = int(os.getenv("SMALL_JOB_RESERVED_SLOTS", 1))
+# Fair-share weights as "user:weight,user:weight"; unlisted users get weight 1
+USER_WEIGHTS = {
+    user.strip(): float(weight)
+    for user, weight in (item.rsplit(":", 1) for item in os.getenv("USER_WEIGHTS", "").split(",") if item.strip())
+}
+
+# Comma-separated users (JWT `sub`) allowed to use admin endpoints and request profiling
+ADMIN_USERS = {user.strip() for user in os.getenv("ADMIN_USERS", USERNAME).split(",") if user.strip()}
+# Per-request profiling: fraction of downloads sampled, sample interval, and how many profiles to keep
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+# Download engine: "yt-dlp" (default) or "async" to stream progressive formats over a shared aiohttp pool
+DOWNLOAD_ENGINE = os.getenv("DOWNLOAD_ENGINE", "yt-dlp")
+ASYNC_DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("ASYNC_DOWNLOAD_MAX_CONNECTIONS", 32))
+ASYNC_DOWNLOAD_CHUNK_SIZE = int(os.getenv("ASYNC_DOWNLOAD_CHUNK_SIZE", 256 * 1024))
+ASYNC_DOWNLOAD_RANGE_PARTS = int(os.getenv("ASYNC_DOWNLOAD_RANGE_PARTS", 4))
+ASYNC_DOWNLOAD_RANGE_MIN_SIZE = int(os.getenv("ASYNC_DOWNLOAD_RANGE_MIN_SIZE", 4 * 1024 * 1024))
+
+# Server-side cache for /videos/search results
+SEARCH_CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL_SECONDS", 300))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 256))
+# Deadline for the yt-dlp lookup behind a /videos/search miss
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", 120))
@@ -0,0 +1,82 @@
+import time
+import uuid
+import threading
+from typing import Optional
+
+from app.core.mainScript import JobCancelledError
+
+
+class Job:
+    """A single download request that can be cancelled or can run out of time."""
+
+    def __init__(self, job_id: str, owner: str, timeout_seconds: Optional[float] = None):
+        self.job_id = job_id
+        self.owner = owner
+        self.created_at = time.monotonic()
+        self.deadline = self.created_at + timeout_seconds if timeout_seconds else None
+        self.cancel_reason = None
+        self._cancelled = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if the job has no deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled"):
+        """Mark the job as cancelled and run the registered cancel callbacks once."""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self.cancel_reason = reason
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_cancel_callback(self, callback):
+        """Call `callback(job)` when the job is cancelled (immediately if it already is)."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def check(self):
+        """Raise JobCancelledError if the job was cancelled or its deadline has passed."""
+        if not self._cancelled.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        if self._cancelled.is_set():
+            raise JobCancelledError(f"Job {self.job_id} stopped: {self.cancel_reason}")
+
+
+# Keyed by (owner, job_id) so client-chosen ids never clash between users
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def create_job(owner: str, timeout_seconds: Optional[float] = None, job_id: Optional[str] = None) -> Job:
+    """Register a new job. Raises ValueError if the owner already has a running job with `job_id`."""
+    job = Job(job_id or uuid.uuid4().hex, owner, timeout_seconds)
+    with _jobs_lock:
+        if (owner, job.job_id) in _jobs:
+            raise ValueError(f"Job id {job.job_id} is already in use")
+        _jobs[(owner, job.job_id)] = job
+    return job
+
+
+def get_job(owner: str, job_id: str) -> Optional[Job]:
+    with _jobs_lock:
+        return _jobs.get((owner, job_id))
+
+
+def remove_job(job: Job):
+    with _jobs_lock:
+        if _jobs.get((job.owner, job.job_id)) is job:
+            del _jobs[(job.owner, job.job_id)]
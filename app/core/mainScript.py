@@ -1,11 +1,17 @@
 import os
+import glob
 import json
 import yt_dlp
+from yt_dlp.utils import DownloadCancelled
 from urllib.parse import urlparse, parse_qs
 import re
+from app.core.config import DOWNLOAD_ENGINE
+from app.core.async_downloader import get_downloader
 
 # Update the cookies path to be configurable
 DEFAULT_COOKIES_PATH = '/home/ubuntu/.yt-dlp/cookies.txt'
+# Ledger of every video ID downloaded so far, shared by all searches
+DOWNLOADED_IDS_PATH = os.path.join(os.path.dirname(__file__), 'downloadedVideoIds.json')
 
 def get_yt_dlp_opts(cookies_path=None):
     """Get base yt-dlp options with cookie support."""
@@ -43,6 +49,15 @@ class DownloadError(YoutubeDownloaderError):
     """Raised when video download fails"""
     pass
 
+class SearchError(YoutubeDownloaderError):
+    """Raised when a search page can't be fetched"""
+    pass
+
+class JobCancelledError(YoutubeDownloaderError):
+    """Raised when a download job is cancelled or runs past its deadline"""
+    # URLs of the videos the job finished before it was stopped
+    video_urls = ()
+
 def get_channel_name(channel_url, cookies_path=None):
     """Get channel name for folder creation."""
     # ydl_opts = {
@@ -109,7 +124,7 @@ def get_channel_url(identifier, type_):
 
 def setup_download_directory(base_path, channel_info=None):
     """Setup download directory and return paths."""
-    json_path = os.path.join(os.path.dirname(__file__), 'downloadedVideoIds.json')
+    json_path = DOWNLOADED_IDS_PATH
     if not channel_info:
         download_path = base_path
         # json_path = os.path.join(base_path, 'downloadedVideoIds.json')
@@ -162,7 +177,11 @@ def search_shorts_page_old(query, page_size, downloaded_ids, page=1, channel_inf
             return []
 
 
-def search_shorts_page(query, page_size, downloaded_ids, page=1, channel_info=None, cookies_path=None):
+def search_shorts_entries(query, page_size, downloaded_ids, page=1, channel_info=None, cookies_path=None, raise_errors=False):
+    """
+    Search one page of shorts; returns dicts with the video id, view count and basic metadata.
+    Errors give an empty page unless `raise_errors` is set, in which case SearchError is raised.
+    """
     ydl_opts = get_yt_dlp_opts(cookies_path)
     ydl_opts.update({
         'format': 'best',
@@ -213,11 +232,15 @@ def search_shorts_page(query, page_size, downloaded_ids, page=1, channel_info=No
                         continue
                 
                 # Get view count
-                view_count = int(entry.get('view_count', 0))
+                view_count = int(entry.get('view_count') or 0)
                 
                 filtered_entries.append({
                     'id': video_id,
-                    'view_count': view_count
+                    'view_count': view_count,
+                    'title': entry.get('title'),
+                    'duration': entry.get('duration'),
+                    'channel': entry.get('channel') or entry.get('uploader'),
+                    'url': f"https://www.youtube.com/shorts/{video_id}",
                 })
             
             # Sort by view count if this is a channel search
@@ -231,16 +254,22 @@ def search_shorts_page(query, page_size, downloaded_ids, page=1, channel_info=No
                     for i, entry in enumerate(filtered_entries[:5]):
                         print(f"  {i+1}. ID: {entry['id']}, Views: {entry['view_count']}")
             
-            # Return just the IDs
-            return [entry['id'] for entry in filtered_entries]
+            return filtered_entries
            
         except Exception as e:
             import traceback
             print(f"Error searching videos: {str(e)}")
             print(f"Traceback: {traceback.format_exc()}")
+            if raise_errors:
+                raise SearchError(f"Error searching videos: {str(e)}")
             return []
 
 
+def search_shorts_page(query, page_size, downloaded_ids, page=1, channel_info=None, cookies_path=None):
+    """Search one page of shorts and return just the video IDs."""
+    return [entry['id'] for entry in search_shorts_entries(query, page_size, downloaded_ids, page, channel_info, cookies_path)]
+
+
 def find_unique_videos_old(query, required_count, downloaded_ids, channel_info=None, max_attempts=10):
     unique_videos = []
     page = 1
@@ -272,8 +301,12 @@ def find_unique_videos_old(query, required_count, downloaded_ids, channel_info=N
     return unique_videos[:required_count]
 
 
-def find_unique_videos(query, required_count, downloaded_ids, channel_info=None, max_attempts=10):
-    unique_videos = []
+def find_unique_entries(query, required_count, downloaded_ids, channel_info=None, max_attempts=10, job=None, raise_errors=False):
+    """
+    Page through search results until `required_count` distinct shorts are found; returns their entries.
+    With `raise_errors`, a failed page raises SearchError instead of ending the search early.
+    """
+    unique_videos = {}
     page = 1
     page_size = 50
     attempts = 0
@@ -282,8 +315,10 @@ def find_unique_videos(query, required_count, downloaded_ids, channel_info=None,
     print(f"Search type: {search_type}")
    
     while len(unique_videos) < required_count and attempts < max_attempts:
+        if job:
+            job.check()
         print(f"Searching page {page}...")
-        new_videos = search_shorts_page(query, page_size, downloaded_ids, page, channel_info)
+        new_videos = search_shorts_entries(query, page_size, downloaded_ids, page, channel_info, raise_errors=raise_errors)
        
         if not new_videos and page == 1:
             raise NoVideosFoundError("No videos found matching the search criteria")
@@ -291,22 +326,84 @@ def find_unique_videos(query, required_count, downloaded_ids, channel_info=None,
         if not new_videos:
             break
 
-
-        # unique_videos.extend(new_videos)
-        if new_videos and all(isinstance(vid, str) for vid in new_videos):
-            unique_videos.extend(new_videos)
-            unique_videos = list(dict.fromkeys(unique_videos)) 
-        else:
-             print(f"Warning: Unexpected video format in results: {type(new_videos[0]) if new_videos else 'empty'}")
-        
+        for entry in new_videos:
+            unique_videos.setdefault(entry['id'], entry)
        
         print(f"Found {len(unique_videos)}/{required_count} unique videos")
         page += 1
         attempts += 1
     
-    return unique_videos[:required_count]
+    return list(unique_videos.values())[:required_count]
+
+
+def find_unique_videos(query, required_count, downloaded_ids, channel_info=None, max_attempts=10, job=None):
+    entries = find_unique_entries(query, required_count, downloaded_ids, channel_info, max_attempts, job)
+    return [entry['id'] for entry in entries]
+
+
+def remove_partial_files(output_path, index, video_id):
+    """Delete whatever a stopped download left behind (.part, .ytdl, unmerged streams)."""
+    pattern = os.path.join(glob.escape(output_path), f'{index}_{video_id}_combined.*')
+    for path in glob.glob(pattern):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Warning: Couldn't remove partial file {path}: {str(e)}")
+
+
+def make_cancel_hook(job):
+    """yt-dlp progress hook that aborts the transfer once the job is cancelled."""
+    def hook(progress):
+        try:
+            job.check()
+        except JobCancelledError as e:
+            raise DownloadCancelled(str(e))
+    return hook
+
+
+# Single-file mp4 served over plain HTTP(S), i.e. something a generic HTTP client can fetch.
+# Falls back to 'best' so the extraction can still be reused by yt-dlp when there isn't one.
+PROGRESSIVE_FORMAT = 'best[ext=mp4][protocol^=http][vcodec!=none][acodec!=none]/best'
+
+def resolve_video_info(url, cookies_path=None):
+    """Extract the video, preferring a progressive format; returns the info dict, or None on failure."""
+    ydl_opts = get_yt_dlp_opts(cookies_path)
+    ydl_opts.update({
+        'format': PROGRESSIVE_FORMAT,
+        'extract_flat': False,
+    })
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+    except Exception as e:
+        print(f"Couldn't resolve {url}: {str(e)}")
+        return None
+
+def is_progressive(info):
+    return bool(info.get('url')) and info.get('protocol') in ('http', 'https') and info.get('ext') == 'mp4'
+
+def download_streaming(url, expected_file, cookies_path=None, job=None):
+    """
+    Fetch a progressive format with the async downloader.
+    Returns (streamed, info); when not streamed, `info` (if any) can be handed to yt-dlp instead of re-extracting.
+    """
+    info = resolve_video_info(url, cookies_path)
+    if not info or not is_progressive(info):
+        return False, info
+    if job:
+        job.check()
+    try:
+        get_downloader().download(info['url'], expected_file, info.get('http_headers'), job)
+    except JobCancelledError:
+        raise
+    except Exception as e:
+        print(f"Warning: Async download of {url} failed, falling back to yt-dlp: {str(e)}")
+        return False, info
+    return True, info
+
+
 # [Previous download functions remain the same]
-def download_combined(video_id, output_path, index, json_path, cookies_path=None):
+def download_combined(video_id, output_path, index, json_path, cookies_path=None, job=None):
     url = f"https://www.youtube.com/shorts/{video_id}"
     # 'format': 'bv*[height<=1080]+ba/best',
     ydl_opts = {
@@ -320,17 +417,34 @@ def download_combined(video_id, output_path, index, json_path, cookies_path=None
     if cookies_path and os.path.exists(cookies_path):
         ydl_opts['cookiefile'] = cookies_path
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+    if job:
+        ydl_opts['progress_hooks'] = [make_cancel_hook(job)]
 
+    expected_file = os.path.join(output_path, f'{index}_{video_id}_combined.mp4')
+    streamed, info = False, None
+    if DOWNLOAD_ENGINE == 'async':
+        streamed, info = download_streaming(url, expected_file, cookies_path, job)
+
+    try:
+        if not streamed:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if info:
+                    # Reuse the async engine's extraction instead of fetching the page again
+                    ydl.process_ie_result(ydl.sanitize_info(info), download=True)
+                else:
+                    ydl.download([url])
+
+    except DownloadCancelled:
+        remove_partial_files(output_path, index, video_id)
+        if job:
+            job.check()
+        raise JobCancelledError(f"Download of video {index} was cancelled")
     except Exception as e:
         # If it's not a cookie permission error, raise it
         if not ("Permission denied" in str(e) and "cookies.txt" in str(e)):
             raise DownloadError(f"Error downloading video {index}: {str(e)}")
         
 
-    expected_file = os.path.join(output_path, f'{index}_{video_id}_combined.mp4')
     if os.path.exists(expected_file):
 
         print(f"Downloaded combined video {index}")
@@ -344,7 +458,7 @@ def download_combined(video_id, output_path, index, json_path, cookies_path=None
 
 
 
-def startDownload(search_type, params):
+def startDownload(search_type, params, job=None):
     try: 
         print(f"here is the search type and params: {search_type}, {params}")
         # return
@@ -381,7 +495,7 @@ def startDownload(search_type, params):
         downloaded_ids = load_downloaded_ids(json_path)
         print(f"Found {len(downloaded_ids)} previously downloaded videos")
         
-        video_ids = find_unique_videos(query, max_results, downloaded_ids, channel_info)
+        video_ids = find_unique_videos(query, max_results, downloaded_ids, channel_info, job=job)
 
         if not video_ids:
             raise NoVideosFoundError("No new videos found!")
@@ -395,15 +509,20 @@ def startDownload(search_type, params):
         for index, video_id in enumerate(video_ids, start=1):
             print(f"\nDownloading video {index}/{len(video_ids)}...")
             try:
+                if job:
+                    job.check()
                 success = False
             
                 if download_mode == "1":
-                    success = download_combined(video_id, download_path, index, json_path, cookies_path)
+                    success = download_combined(video_id, download_path, index, json_path, cookies_path, job)
                     if success:
                         video_urls.append(success)
                 
                 if success:
                     successful_downloads += 1
+            except JobCancelledError as e:
+                e.video_urls = list(video_urls)
+                raise
             except Exception as e:
                 if "Permission denied" in str(e) and "cookies.txt" in str(e) and video_urls:
                     continue
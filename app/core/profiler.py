@@ -0,0 +1,180 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from app.core.config import ADMIN_USERS, PROFILE_INTERVAL_MS, PROFILE_MAX_FILES, PROFILE_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIRECTORY = "profiles"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# Ensure profile directory exists
+os.makedirs(PROFILE_DIRECTORY, exist_ok=True)
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread from a background thread."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_MS / 1000):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})".replace(";", ":"))
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Profile in the collapsed-stack format used by flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def should_profile(profile_header, current_user) -> bool:
+    """Profile if an admin asked for it with the X-Profile header, or if the request was sampled."""
+    if profile_header and profile_header.lower() in ("1", "true", "yes") and current_user.get("sub") in ADMIN_USERS:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def run_profiled(metadata, func, *args):
+    """Run `func(*args)` under the sampling profiler and store the result; returns what func returns."""
+    profiler = SamplingProfiler(threading.get_ident())
+    profiler.start()
+    try:
+        return func(*args)
+    finally:
+        profiler.stop()
+        # A failed save must not replace the download's own result or error
+        try:
+            save_profile(profiler, metadata)
+        except Exception as e:
+            logger.error(f"Couldn't save profile {metadata.get('profile_id')}: {e}")
+
+
+def save_profile(profiler, metadata):
+    metadata = dict(metadata)
+    metadata.update({
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "duration_seconds": round(profiler.duration, 3),
+        "interval_seconds": profiler.interval,
+        "samples": sum(profiler.counts.values()),
+    })
+    profile_id = metadata["profile_id"]
+    with open(os.path.join(PROFILE_DIRECTORY, f"{profile_id}.collapsed"), "w") as f:
+        f.write(profiler.collapsed())
+    with open(os.path.join(PROFILE_DIRECTORY, f"{profile_id}.json"), "w") as f:
+        json.dump(metadata, f)
+    print(f"Saved profile {profile_id} ({metadata['samples']} samples)")
+    prune_profiles()
+
+
+def prune_profiles(max_files=PROFILE_MAX_FILES):
+    """Keep only the newest `max_files` profiles."""
+    for metadata in list_profiles()[max_files:]:
+        for ext in ("collapsed", "json"):
+            try:
+                os.remove(os.path.join(PROFILE_DIRECTORY, f"{metadata['profile_id']}.{ext}"))
+            except OSError:
+                pass
+
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex
+
+
+def list_profiles():
+    """Metadata of stored profiles, newest first."""
+    profiles = []
+    for name in os.listdir(PROFILE_DIRECTORY):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIRECTORY, name), "r") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda metadata: metadata.get("created_at", ""), reverse=True)
+    return profiles
+
+
+def load_profile(profile_id):
+    """Return (metadata, collapsed stacks) for a stored profile, or None if it doesn't exist."""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIRECTORY, f"{profile_id}.json"), "r") as f:
+            metadata = json.load(f)
+        with open(os.path.join(PROFILE_DIRECTORY, f"{profile_id}.collapsed"), "r") as f:
+            collapsed = f.read()
+    except (OSError, ValueError):
+        return None
+    return metadata, collapsed
+
+
+def to_speedscope(metadata, collapsed) -> dict:
+    """
+    Convert collapsed stacks into a speedscope 'sampled' profile.
+
+    The sampler wakes up less often than its nominal interval while the sampled
+    thread holds the GIL, so each sample is weighted by the measured wall time
+    per sample instead of the interval.
+    """
+    seconds_per_sample = metadata["interval_seconds"]
+    if metadata.get("samples") and metadata.get("duration_seconds"):
+        seconds_per_sample = metadata["duration_seconds"] / metadata["samples"]
+    frames, frame_index, samples, weights = [], {}, [], []
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        indexes = []
+        for name in stack.split(";"):
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            indexes.append(frame_index[name])
+        samples.append(indexes)
+        weights.append(int(count) * seconds_per_sample)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{metadata.get('path', 'request')} {metadata['profile_id']}",
+        "exporter": "yt-shorts-downloader-api",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": metadata["profile_id"],
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
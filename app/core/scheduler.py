@@ -0,0 +1,215 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from app.core.config import (
+    MAX_CONCURRENT_DOWNLOADS,
+    MAX_IN_FLIGHT_PER_USER,
+    SMALL_JOB_MAX_RESULTS,
+    SMALL_JOB_RESERVED_SLOTS,
+    USER_WEIGHTS,
+)
+from app.core.mainScript import JobCancelledError
+
+SMALL_LANE = "small"
+BULK_LANE = "bulk"
+
+
+class Ticket:
+    """A job's place in the scheduler queue."""
+
+    def __init__(self, user, cost, lane, start_tag, finish_tag, future, job=None):
+        self.user = user
+        self.cost = cost
+        self.lane = lane
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.future = future
+        self.job = job
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+
+    @property
+    def wait_seconds(self) -> float:
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+
+class FairScheduler:
+    """
+    Weighted fair-share admission for download jobs.
+
+    Every user has a FIFO queue per lane. A job's cost is its `max_results`
+    divided by the user's weight, and the next job to start is the queued
+    head with the smallest virtual finish tag (start-time fair queueing), so
+    a user submitting many large jobs only gets their share of the slots.
+    Jobs of at most `small_job_max_results` go to a priority lane that is
+    always served first and has `reserved_small_slots` that bulk jobs cannot
+    use. No user may have more than `per_user_limit` jobs running at once.
+
+    Must be used from the event loop; cancel callbacks from other threads are
+    handed back to the loop.
+    """
+
+    def __init__(self, max_concurrent, per_user_limit, small_job_max_results, reserved_small_slots, weights=None):
+        self.max_concurrent = max_concurrent
+        self.per_user_limit = per_user_limit
+        self.small_job_max_results = small_job_max_results
+        self.bulk_limit = max(1, max_concurrent - reserved_small_slots)
+        self.weights = weights or {}
+        self._queues = {SMALL_LANE: {}, BULK_LANE: {}}
+        self._in_flight = {}
+        self._running = {SMALL_LANE: 0, BULK_LANE: 0}
+        self._last_finish = {}
+        self._virtual_time = 0.0
+        self._waits = {SMALL_LANE: deque(maxlen=500), BULK_LANE: deque(maxlen=500)}
+
+    def weight(self, user) -> float:
+        return self.weights.get(user, 1.0)
+
+    @asynccontextmanager
+    async def slot(self, user, cost, job=None):
+        """Wait for a free slot for `user`, hold it for the body of the `async with`."""
+        ticket = await self.acquire(user, cost, job)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire(self, user, cost, job=None) -> Ticket:
+        """Queue a job and wait until it is dispatched. Raises JobCancelledError if the job stops first."""
+        loop = asyncio.get_running_loop()
+        lane = SMALL_LANE if cost <= self.small_job_max_results else BULK_LANE
+        start_tag = max(self._virtual_time, self._last_finish.get(user, 0.0))
+        finish_tag = start_tag + cost / self.weight(user)
+        self._last_finish[user] = finish_tag
+        ticket = Ticket(user, cost, lane, start_tag, finish_tag, loop.create_future(), job)
+        self._queues[lane].setdefault(user, deque()).append(ticket)
+        self._dispatch()
+
+        if job:
+            job.add_cancel_callback(lambda _job: loop.call_soon_threadsafe(self._abandon, ticket))
+        try:
+            if job and job.deadline is not None:
+                await asyncio.wait_for(ticket.future, timeout=job.remaining())
+            else:
+                await ticket.future
+        except asyncio.TimeoutError:
+            job.cancel("deadline exceeded")
+            if ticket.started_at is not None:
+                self.release(ticket)
+            else:
+                self._abandon(ticket)
+            job.check()
+        except BaseException:
+            if ticket.started_at is not None:
+                self.release(ticket)
+            else:
+                self._abandon(ticket)
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket):
+        """Free the slot held by a dispatched ticket and start whoever is next."""
+        self._running[ticket.lane] -= 1
+        self._in_flight[ticket.user] -= 1
+        if not self._in_flight[ticket.user]:
+            del self._in_flight[ticket.user]
+        self._dispatch()
+        self._forget_idle_users()
+
+    def _abandon(self, ticket: Ticket):
+        """Drop a ticket that is still queued, failing its waiter with JobCancelledError."""
+        if ticket.started_at is not None:
+            return
+        queue = self._queues[ticket.lane].get(ticket.user)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.lane][ticket.user]
+            # Give back the share the job reserved, unless a later job already built on it
+            if self._last_finish.get(ticket.user) == ticket.finish_tag:
+                self._last_finish[ticket.user] = ticket.start_tag
+            self._forget_idle_users()
+        if not ticket.future.done():
+            reason = ticket.job.cancel_reason if ticket.job else "cancelled"
+            ticket.future.set_exception(JobCancelledError(f"Job stopped while queued: {reason}"))
+
+    def _forget_idle_users(self):
+        """Drop finish tags that no longer affect scheduling, so `_last_finish` doesn't grow forever."""
+        if not any(self._running.values()) and not any(self._queues.values()):
+            # Nothing left anywhere: move virtual time past every tag and start afresh
+            self._virtual_time = max([self._virtual_time, *self._last_finish.values()])
+            self._last_finish.clear()
+            return
+        for user, finish_tag in list(self._last_finish.items()):
+            busy = user in self._in_flight or any(user in queues for queues in self._queues.values())
+            if not busy and finish_tag <= self._virtual_time:
+                del self._last_finish[user]
+
+    def _next_ticket(self, lane) -> Optional[Ticket]:
+        """Head ticket with the smallest finish tag among users below their in-flight cap."""
+        best = None
+        for user, queue in self._queues[lane].items():
+            if self._in_flight.get(user, 0) >= self.per_user_limit:
+                continue
+            if best is None or queue[0].finish_tag < best.finish_tag:
+                best = queue[0]
+        return best
+
+    def _dispatch(self):
+        while sum(self._running.values()) < self.max_concurrent:
+            ticket = self._next_ticket(SMALL_LANE)
+            if ticket is None and self._running[BULK_LANE] < self.bulk_limit:
+                ticket = self._next_ticket(BULK_LANE)
+            if ticket is None:
+                return
+
+            queue = self._queues[ticket.lane][ticket.user]
+            queue.popleft()
+            if not queue:
+                del self._queues[ticket.lane][ticket.user]
+            ticket.started_at = time.monotonic()
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            self._running[ticket.lane] += 1
+            self._in_flight[ticket.user] = self._in_flight.get(ticket.user, 0) + 1
+            self._waits[ticket.lane].append(ticket.wait_seconds)
+            if not ticket.future.done():
+                ticket.future.set_result(ticket)
+
+    def stats(self, user=None) -> dict:
+        """Queue depth and recent wait times per lane, plus the given user's own counts."""
+        lanes = {}
+        for lane in (SMALL_LANE, BULK_LANE):
+            waits = sorted(self._waits[lane])
+            queued = self._queues[lane].values()
+            lanes[lane] = {
+                "running": self._running[lane],
+                "queued": sum(len(queue) for queue in queued),
+                "oldest_wait_seconds": round(max((queue[0].wait_seconds for queue in queued), default=0.0), 3),
+                "recent_wait_avg_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "recent_wait_p95_seconds": round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else 0.0,
+            }
+        stats = {
+            "max_concurrent": self.max_concurrent,
+            "per_user_limit": self.per_user_limit,
+            "small_job_max_results": self.small_job_max_results,
+            "lanes": lanes,
+        }
+        if user is not None:
+            stats["user"] = {
+                "in_flight": self._in_flight.get(user, 0),
+                "queued": sum(len(self._queues[lane].get(user, ())) for lane in (SMALL_LANE, BULK_LANE)),
+                "weight": self.weight(user),
+            }
+        return stats
+
+
+download_scheduler = FairScheduler(
+    MAX_CONCURRENT_DOWNLOADS,
+    MAX_IN_FLIGHT_PER_USER,
+    SMALL_JOB_MAX_RESULTS,
+    SMALL_JOB_RESERVED_SLOTS,
+    USER_WEIGHTS,
+)
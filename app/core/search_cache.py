@@ -0,0 +1,70 @@
+import time
+import asyncio
+import threading
+import concurrent.futures
+
+from cachetools import TTLCache
+
+from app.core.config import SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_TTL_SECONDS
+from app.core.mainScript import JobCancelledError
+
+
+class SearchCache:
+    """
+    TTL cache for search results with request coalescing.
+
+    Concurrent misses for the same key share one computation instead of each
+    running their own yt-dlp search. If the caller running the search gives up
+    (its task or job is cancelled), the waiters retry and one of them takes
+    over. Safe to use from several event loops.
+    """
+
+    def __init__(self, max_entries=SEARCH_CACHE_MAX_ENTRIES, ttl_seconds=SEARCH_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    async def get_or_compute(self, key, compute):
+        """
+        Return (value, age in seconds, hit) for `key`, awaiting `compute()` on a miss.
+        Only one `compute()` runs per key at a time; other callers wait for its result.
+        """
+        while True:
+            with self._lock:
+                cached = self._cache.get(key)
+                pending = self._pending.get(key)
+                if cached is None and pending is None:
+                    future = self._pending[key] = concurrent.futures.Future()
+            if cached is not None:
+                value, stored_at = cached
+                return value, time.monotonic() - stored_at, True
+            if pending is None:
+                break
+            try:
+                value = await asyncio.shield(asyncio.wrap_future(pending))
+            except asyncio.CancelledError:
+                if pending.cancelled():
+                    continue  # the leader gave up, not us: look again and maybe compute it ourselves
+                raise
+            return value, 0.0, True
+
+        try:
+            value = await compute()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            if isinstance(e, (asyncio.CancelledError, JobCancelledError)):
+                # Only the leader's own request was stopped, so the waiters shouldn't fail with it
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        with self._lock:
+            self._cache[key] = (value, time.monotonic())
+            del self._pending[key]
+        future.set_result(value)
+        return value, 0.0, False
+
+
+search_cache = SearchCache()
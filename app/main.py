@@ -3,8 +3,9 @@ import logging
 from typing import Union
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from app.api.v1.endpoints import auth, video
+from app.api.v1.endpoints import admin, auth, video
 from app.core.logging_config import setup_logging
+from app.core.async_downloader import close_downloader
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError, HTTPException
 from app.core.exception_handlers import validation_exception_handler, general_exception_handler, http_exception_handler
@@ -34,6 +35,10 @@ app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, general_exception_handler)
 app.add_exception_handler(HTTPException, http_exception_handler)
 
+@app.on_event("shutdown")
+def shutdown_downloader():
+    close_downloader()
+
 @app.get("/")
 def read_root():
     logging.info("Root endpoint accessed.")
@@ -47,6 +52,7 @@ app.mount("/videosList", StaticFiles(directory=videos_dir), name="videos")
 
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(video.router, prefix="/videos", tags=["videos"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 
 @app.get("/error")
@@ -1,10 +1,18 @@
-from pydantic import BaseModel, Field, conint
-from typing import Literal, Union
+from pydantic import BaseModel, Field, conint, constr
+from typing import Literal, Optional, Union
 
 class BaseDownloadRequest(BaseModel):
     max_results: conint(gt=0, le=100) = Field( # type: ignore
         description="Number of shorts to download (1-100)"
     )
+    timeout_seconds: Optional[conint(gt=0, le=3600)] = Field( # type: ignore
+        default=None,
+        description="Deadline for the whole request in seconds; the job is cancelled once it passes"
+    )
+    job_id: Optional[constr(pattern=r"^[A-Za-z0-9_-]{1,64}$")] = Field( # type: ignore
+        default=None,
+        description="Client-chosen job id, usable with /videos/jobs/{job_id}/cancel while the request runs"
+    )
 
 class KeywordSearchRequest(BaseDownloadRequest):
     search_type: Literal["keyword"] = Field(
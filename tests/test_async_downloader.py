@@ -0,0 +1,117 @@
+import os
+import re
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from app.core.async_downloader import AsyncMediaDownloader, StreamingDownloadError
+from app.core.jobs import create_job
+from app.core.mainScript import JobCancelledError
+
+MEDIA = os.urandom(300 * 1024 + 17)
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d+)")
+
+
+def _requested_range(request):
+    match = RANGE_PATTERN.match(request.headers.get("Range", ""))
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+async def full_body(request):
+    """Ignores Range and always answers 200."""
+    return web.Response(body=MEDIA)
+
+
+async def ranged(request):
+    """Honours Range with a known total."""
+    requested = _requested_range(request)
+    if requested is None:
+        return web.Response(body=MEDIA)
+    start, end = requested
+    return web.Response(status=206, body=MEDIA[start:end + 1],
+                        headers={"Content-Range": f"bytes {start}-{end}/{len(MEDIA)}"})
+
+
+async def ranged_unknown_total(request):
+    """Honours Range but doesn't report the total size."""
+    requested = _requested_range(request)
+    if requested is None:
+        return web.Response(body=MEDIA)
+    start, end = requested
+    return web.Response(status=206, body=MEDIA[start:end + 1], headers={"Content-Range": f"bytes {start}-{end}/*"})
+
+
+async def range_probe_only(request):
+    """Answers the probe with a total, then ignores Range on the real requests."""
+    requested = _requested_range(request)
+    if requested == (0, 0):
+        return web.Response(status=206, body=MEDIA[:1], headers={"Content-Range": f"bytes 0-0/{len(MEDIA)}"})
+    return web.Response(body=MEDIA)
+
+
+@pytest.fixture(scope="module")
+def media_server():
+    app = web.Application()
+    app.router.add_get("/full", full_body)
+    app.router.add_get("/ranged", ranged)
+    app.router.add_get("/ranged-unknown-total", ranged_unknown_total)
+    app.router.add_get("/range-probe-only", range_probe_only)
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{port}"
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def downloader():
+    downloader = AsyncMediaDownloader(chunk_size=16 * 1024, range_parts=4, range_min_size=64 * 1024)
+    yield downloader
+    downloader.close()
+
+
+@pytest.mark.parametrize("path", ["/full", "/ranged", "/ranged-unknown-total"])
+def test_download_writes_the_whole_file(media_server, downloader, tmp_path, path):
+    dest = str(tmp_path / "video.mp4")
+    assert downloader.download(media_server + path, dest) == len(MEDIA)
+    with open(dest, "rb") as f:
+        assert f.read() == MEDIA
+    assert not os.path.exists(dest + ".part")
+
+
+def test_small_file_uses_a_single_range(media_server, tmp_path):
+    downloader = AsyncMediaDownloader(chunk_size=16 * 1024, range_parts=4, range_min_size=len(MEDIA) + 1)
+    try:
+        dest = str(tmp_path / "video.mp4")
+        assert downloader.download(media_server + "/ranged", dest) == len(MEDIA)
+        with open(dest, "rb") as f:
+            assert f.read() == MEDIA
+    finally:
+        downloader.close()
+
+
+def test_failed_download_removes_part_file(media_server, downloader, tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    with pytest.raises(StreamingDownloadError):
+        downloader.download(media_server + "/range-probe-only", dest)
+    assert os.listdir(tmp_path) == []
+
+
+def test_cancelled_download_removes_part_file(media_server, downloader, tmp_path):
+    job = create_job("tester")
+    job.cancel("test")
+    dest = str(tmp_path / "video.mp4")
+    with pytest.raises(JobCancelledError):
+        downloader.download(media_server + "/full", dest, job=job)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+import app.core.scheduler as scheduler_module
+from app.core.jobs import create_job
+from app.core.mainScript import JobCancelledError
+from app.core.scheduler import FairScheduler
+
+
+async def _dispatch_order(scheduler, submissions):
+    """Queue `submissions` behind a blocker and return the users in the order they got the single slot."""
+    blocker = await scheduler.acquire("blocker", 1)
+    order = []
+
+    async def worker(user, cost):
+        async with scheduler.slot(user, cost):
+            order.append(user)
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.ensure_future(worker(user, cost)) for user, cost in submissions]
+    await asyncio.sleep(0)
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_weighted_fair_share_order():
+    scheduler = FairScheduler(1, 1, 0, 0, weights={"a": 2})
+    # a's finish tags: 5, 10, 15 (cost 10 / weight 2); b's: 12, 24, 36
+    submissions = [("a", 10)] * 3 + [("b", 12)] * 3
+    order = asyncio.run(_dispatch_order(scheduler, submissions))
+    assert order == ["a", "a", "b", "a", "b", "b"]
+
+
+def test_heavy_user_does_not_starve_later_user():
+    scheduler = FairScheduler(1, 1, 0, 0)
+    submissions = [("heavy", 100)] * 3 + [("light", 100)]
+    order = asyncio.run(_dispatch_order(scheduler, submissions))
+    assert order.index("light") == 1
+
+
+def test_per_user_in_flight_cap():
+    async def main():
+        scheduler = FairScheduler(3, 1, 0, 0)
+        first = await scheduler.acquire("a", 10)
+        second = asyncio.ensure_future(scheduler.acquire("a", 10))
+        other = await scheduler.acquire("b", 10)
+        await asyncio.sleep(0)
+        assert not second.done()
+        assert scheduler.stats("a")["user"] == {"in_flight": 1, "queued": 1, "weight": 1.0}
+
+        scheduler.release(first)
+        scheduler.release(await second)
+        scheduler.release(other)
+
+    asyncio.run(main())
+
+
+def test_small_lane_is_served_first():
+    scheduler = FairScheduler(1, 1, 5, 0)
+    order = asyncio.run(_dispatch_order(scheduler, [("bulk", 50), ("small", 1)]))
+    assert order == ["small", "bulk"]
+
+
+def test_reserved_small_slots_are_kept_from_bulk_jobs():
+    async def main():
+        scheduler = FairScheduler(2, 5, 5, 1)
+        bulk = await scheduler.acquire("bulk", 50)
+        queued_bulk = asyncio.ensure_future(scheduler.acquire("bulk", 50))
+        await asyncio.sleep(0)
+        assert not queued_bulk.done()
+
+        small = await asyncio.wait_for(scheduler.acquire("small", 1), timeout=1)
+        assert scheduler.stats()["lanes"]["small"]["running"] == 1
+
+        scheduler.release(small)
+        scheduler.release(bulk)
+        scheduler.release(await queued_bulk)
+
+    asyncio.run(main())
+
+
+def test_late_timeout_releases_dispatched_slot(monkeypatch):
+    async def dispatched_then_timed_out(future, timeout):
+        await future
+        raise asyncio.TimeoutError()
+
+    monkeypatch.setattr(scheduler_module.asyncio, "wait_for", dispatched_then_timed_out)
+
+    async def main():
+        scheduler = FairScheduler(1, 1, 0, 0)
+        job = create_job("a", timeout_seconds=60)
+        with pytest.raises(JobCancelledError):
+            await scheduler.acquire("a", 10, job)
+        assert scheduler.stats()["lanes"]["bulk"]["running"] == 0
+        assert scheduler._in_flight == {}
+
+    asyncio.run(main())
+
+
+def test_abandoned_ticket_rolls_back_finish_tag():
+    async def main():
+        scheduler = FairScheduler(1, 1, 0, 0)
+        blocker = await scheduler.acquire("blocker", 1)
+        kept = asyncio.ensure_future(scheduler.acquire("b", 10))
+        job = create_job("b")
+        cancelled = asyncio.ensure_future(scheduler.acquire("b", 50, job))
+        await asyncio.sleep(0)
+        assert scheduler._last_finish["b"] == 60
+
+        job.cancel("test")
+        with pytest.raises(JobCancelledError):
+            await cancelled
+        assert scheduler._last_finish["b"] == 10
+
+        scheduler.release(blocker)
+        scheduler.release(await kept)
+
+    asyncio.run(main())
+
+
+def test_finish_tags_are_forgotten_once_users_are_idle():
+    scheduler = FairScheduler(1, 1, 0, 0)
+    asyncio.run(_dispatch_order(scheduler, [("a", 10), ("b", 10), ("c", 10)]))
+    assert scheduler._last_finish == {}
+    assert scheduler._virtual_time >= 10
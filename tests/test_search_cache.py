@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from app.api.v1.endpoints.video import etag_matches
+from app.core.jobs import create_job
+from app.core.search_cache import SearchCache
+
+
+def test_concurrent_misses_share_one_compute():
+    cache = SearchCache(max_entries=8, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["a", "b"]
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [value for value, _, _ in results] == [["a", "b"]] * 5
+    assert sorted(hit for _, _, hit in results) == [False, True, True, True, True]
+
+    value, age, hit = asyncio.run(cache.get_or_compute("key", compute))
+    assert (value, hit) == (["a", "b"], True)
+    assert age >= 0
+    assert len(calls) == 1
+
+
+def test_errors_are_not_cached():
+    cache = SearchCache(max_entries=8, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("page failed")
+        return ["a"]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_compute("key", compute))
+    value, _, hit = asyncio.run(cache.get_or_compute("key", compute))
+    assert (value, hit) == (["a"], False)
+    assert len(calls) == 2
+
+
+def test_waiters_share_the_leaders_error():
+    cache = SearchCache(max_entries=8, ttl_seconds=60)
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("page failed")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(main()))
+
+
+@pytest.mark.parametrize("cancel_leader", ["task", "job"])
+def test_waiter_takes_over_when_the_leader_is_cancelled(cancel_leader):
+    cache = SearchCache(max_entries=8, ttl_seconds=60)
+    job = create_job("leader")
+    started = []
+
+    async def leader_compute():
+        started.append("leader")
+        while True:
+            job.check()
+            await asyncio.sleep(0.001)
+
+    async def waiter_compute():
+        started.append("waiter")
+        return ["a"]
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_compute("key", leader_compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(cache.get_or_compute("key", waiter_compute))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        if cancel_leader == "task":
+            leader.cancel()
+        else:
+            job.cancel("client disconnected")
+        await asyncio.gather(leader, return_exceptions=True)
+        return await waiter
+
+    value, _, hit = asyncio.run(main())
+    assert (value, hit) == (["a"], False)
+    assert started == ["leader", "waiter"]
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ('"other"', False),
+    ("*", True),
+])
+def test_etag_matches(if_none_match, expected):
+    assert etag_matches(if_none_match, '"abc"') is expected